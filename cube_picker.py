@@ -2,22 +2,65 @@ import cv2
 import numpy as np
 import os
 import time as t
-from pymycobot import MyCobot280
-import RPi.GPIO as GPIO
+from yolo_detector import YoloDetector
+from inference_server import InferenceClient
+
+try:
+    from pymycobot import MyCobot280
+    import RPi.GPIO as GPIO
+except ImportError:  # off-robot (replay / benchmarking); only vision is usable
+    MyCobot280 = GPIO = None
+
+# One row per detection, as returned by CubePicker.detect()
+DETECTION_DTYPE = np.dtype([
+    ("name", "U32"),
+    ("kind", "U4"),            # "cube" (HSV) or "yolo"
+    ("center", np.int32, 2),   # cx, cy
+    ("box", np.int32, 4),      # x, y, w, h
+    ("score", np.float32),     # YOLO confidence; 1.0 for cubes
+])
+
+
+def make_detections(names, kinds, boxes, scores):
+    """Build a DETECTION_DTYPE array; centers are taken from the boxes."""
+    dets = np.zeros(len(names), dtype=DETECTION_DTYPE)
+    if len(dets):
+        boxes = np.asarray(boxes, dtype=np.int32).reshape(-1, 4)
+        dets["name"] = names
+        dets["kind"] = kinds
+        dets["box"] = boxes
+        dets["center"] = boxes[:, :2] + boxes[:, 2:] // 2
+        dets["score"] = scores
+    return dets
+
+
+def box_iou(a, b):
+    """Pairwise IoU of (N, 4) and (M, 4) x, y, w, h boxes -> (N, M)."""
+    a = np.asarray(a, dtype=np.float32).reshape(-1, 4)[:, None, :]
+    b = np.asarray(b, dtype=np.float32).reshape(-1, 4)[None, :, :]
+    iw = np.clip(np.minimum(a[..., 0] + a[..., 2], b[..., 0] + b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    ih = np.clip(np.minimum(a[..., 1] + a[..., 3], b[..., 1] + b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    inter = iw * ih
+    union = a[..., 2] * a[..., 3] + b[..., 2] * b[..., 3] - inter
+    return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
 
 
 class CubePicker:
-    def __init__(self, serial_port=None, baud=1000000, camera_index=0, yolo_onnx_path=None, coco_names_path=None):
+    def __init__(self, serial_port=None, baud=1000000, camera_index=0, yolo_onnx_path=None, coco_names_path=None,
+                 hardware=True, inference_server=None, gpio=None, arm=None):
         # --- Hardware handles ---
         self.mc = None
+        self.GPIO = None
         self.cap = None
         self.camera_index = camera_index
+        self.frame_rotation = cv2.ROTATE_180  # camera is mounted upside down; None for pre-rotated sources
 
         # --- Vision/Calibration state ---
         self.aruco_dict = cv2.aruco.Dictionary_get(cv2.aruco.DICT_6X6_250)
         self.aruco_params = cv2.aruco.DetectorParameters_create()
         self.aruco_centers = []  # rolling collection for averaging
         self.c1X = self.c1Y = self.c2X = self.c2Y = 0
+        self.crop_scale = 1.5  # crop_frame() upscaling
         self.aruco1_center = None
         self.aruco2_center = None
         self.real_aruco1_center = (58,100)
@@ -31,6 +74,7 @@ class CubePicker:
             "yellow": [np.array([22, 100, 100]), np.array([30, 255, 255])],
             "red":    [np.array([0, 107, 149]),  np.array([8, 255, 255])],
         }
+        self.MIN_CUBE_AREA = 10000  # px of HSV mask, shared by detect() and verify_grasp()
         self.colors = {
             "blue":   [160, 133, 56],
             "green":  [106, 144, 41],
@@ -43,19 +87,17 @@ class CubePicker:
         self.yolo_onnx_path = yolo_onnx_path or os.path.join(default_root, "yolov5s.onnx")
         self.coco_names_path = coco_names_path or os.path.join(default_root, "coco.names")
 
-        self.INPUT_WIDTH = 640
-        self.INPUT_HEIGHT = 640
-        self.CONFIDENCE_THRESHOLD = 0.45
-        self.SCORE_THRESHOLD = 0.50
-        self.NMS_THRESHOLD = 0.45
-
         try:
             with open(self.coco_names_path, "r") as f:
                 self.coco_classes = [ln.strip() for ln in f.readlines() if ln.strip()]
         except Exception:
             self.coco_classes = None
 
-        self.yolo_net = cv2.dnn.readNet(self.yolo_onnx_path)
+        # Either a local net or a connection to a shared inference_server.py (socket path or "host:port")
+        if inference_server:
+            self.yolo = InferenceClient(inference_server)
+        else:
+            self.yolo = YoloDetector(self.yolo_onnx_path)
 
         # --- Motion presets ---
         self.move_angles = [
@@ -70,18 +112,30 @@ class CubePicker:
             "red": [-6.9, 173.2, 201.5, 179.93, 0.63, 33.83], # B Sorting area
         }
 
+        if hardware:
+            self._init_hardware(serial_port, baud, gpio, arm)
+
+    # ========== Hardware ==========
+    def _init_hardware(self, serial_port, baud, gpio=None, arm=None):
+        """gpio/arm replace RPi.GPIO and the serial MyCobot280 (e.g. the drivers in sim_drivers.py)."""
+        if (gpio is None and GPIO is None) or (arm is None and MyCobot280 is None):
+            raise RuntimeError("RPi.GPIO and pymycobot are required when hardware=True.")
+
         # --- GPIO / gripper ---
-        self.GPIO = GPIO
-        GPIO.setwarnings(False)
-        GPIO.setmode(GPIO.BCM)
-        GPIO.setup(20, GPIO.OUT)
-        GPIO.setup(21, GPIO.OUT)
-        GPIO.output(20, 1)
-        GPIO.output(21, 1)
+        self.GPIO = gpio or GPIO
+        self.GPIO.setwarnings(False)
+        self.GPIO.setmode(self.GPIO.BCM)
+        self.GPIO.setup(20, self.GPIO.OUT)
+        self.GPIO.setup(21, self.GPIO.OUT)
+        self.GPIO.output(20, 1)
+        self.GPIO.output(21, 1)
 
         # --- Robot init ---
-        port = serial_port or os.popen("ls /dev/ttyAMA*").readline().strip()
-        self.mc = MyCobot280(port, baud)
+        if arm is not None:
+            self.mc = arm
+        else:
+            port = serial_port or os.popen("ls /dev/ttyAMA*").readline().strip()
+            self.mc = MyCobot280(port, baud)
         self.mc.power_on()
         self.mc.send_angles(self.move_angles[0], 20)
         t.sleep(2.5)
@@ -93,11 +147,25 @@ class CubePicker:
             if not self.cap.isOpened():
                 self.cap.open(self.camera_index)
 
+    def read_frame(self):
+        """Read one frame from the camera (or any cap-like source), rotated into workspace orientation."""
+        ok, frame = self.cap.read()
+        if not ok:
+            return False, None
+        if self.frame_rotation is not None:
+            frame = cv2.rotate(frame, self.frame_rotation)
+        return True, frame
+
     def close(self):
         if self.cap is not None:
             self.cap.release()
             self.cap = None
-        cv2.destroyAllWindows()
+        if isinstance(self.yolo, InferenceClient):
+            self.yolo.close()
+        try:
+            cv2.destroyAllWindows()
+        except cv2.error:  # OpenCV built without GUI support (headless)
+            pass
 
     # ========== Init and Calibration ==========
     def initialize(self, init_frames=12):
@@ -105,8 +173,7 @@ class CubePicker:
         self.open_camera()
         self.aruco_centers.clear()
         for _ in range(init_frames):
-            ok, frame = self.cap.read()
-            frame = cv2.rotate(frame, cv2.ROTATE_180)
+            ok, frame = self.read_frame()
             if not ok: continue
             self._detect_aruco_into_buffer(frame)
         self._set_crop_corners()
@@ -115,8 +182,7 @@ class CubePicker:
         """Refine ArUco centers on cropped frames and compute image->robot mapping."""
         self.aruco_centers.clear()
         for _ in range(calib_frames):
-            ok, frame = self.cap.read()
-            frame = cv2.rotate(frame, cv2.ROTATE_180)
+            ok, frame = self.read_frame()
             if not ok: continue
             frame = self.crop_frame(frame)
             self._detect_aruco_into_buffer(frame)
@@ -127,67 +193,159 @@ class CubePicker:
         x_min, x_max = sorted([self.c1X, self.c2X])
         y_min, y_max = sorted([self.c1Y, self.c2Y])
         cropped = img[y_min:y_max, x_min:x_max]
-        cropped = cv2.resize(cropped, (0, 0), fx=1.5, fy=1.5, interpolation=cv2.INTER_CUBIC)
+        cropped = cv2.resize(cropped, (0, 0), fx=self.crop_scale, fy=self.crop_scale, interpolation=cv2.INTER_CUBIC)
         return cropped
 
-    def detect_objects(self, img, center_threshold=2):
-        objects, centers = [], []
-        annotated_frame = img.copy()
-        cube_boxes = []  # store bounding boxes for cubes (x, y, w, h)
+    def crop_point(self, x, y):
+        """Map a pixel of the full (rotated) frame into crop_frame() coordinates."""
+        x_min = min(self.c1X, self.c2X)
+        y_min = min(self.c1Y, self.c2Y)
+        return (x - x_min) * self.crop_scale, (y - y_min) * self.crop_scale
+
+    def uncrop_point(self, x, y):
+        """Map a crop_frame() pixel back into the full (rotated) frame; the inverse of crop_point()."""
+        x_min = min(self.c1X, self.c2X)
+        y_min = min(self.c1Y, self.c2Y)
+        return x / self.crop_scale + x_min, y / self.crop_scale + y_min
+
+    def detect(self, img, center_threshold=2, iou_threshold=0.5, min_area=None):
+        """
+        Detect colour cubes (HSV) and YOLO objects without touching the frame.
+        Returns a DETECTION_DTYPE array: cubes first, then YOLO objects that do not overlap a cube.
+        """
+        min_area = self.MIN_CUBE_AREA if min_area is None else min_area
+        names, boxes = [], []
 
         # --- DETECTING CUBES ---
+        # One connected-component pass per colour; blob statistics are filtered in bulk
         hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
         for color, (lower, upper) in self.HSV.items():
-            rgb = self.colors[color]
             mask = cv2.inRange(hsv, lower, upper)
-            _, binary = cv2.threshold(mask, 127, 255, cv2.THRESH_BINARY)
-            contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            for c in contours:
-                if cv2.contourArea(c) > 10000:
-                    x, y, w, h = cv2.boundingRect(c)
-                    cv2.rectangle(annotated_frame, (x, y), (x + w, y + h), rgb, 2)
-                    cx, cy = (x + w // 2, y + h // 2)
-                    cv2.circle(annotated_frame, (cx, cy), 3, (255, 255, 255), -1)
-                    cv2.putText(annotated_frame, f"{color} cube", (x, max(0, y - 6)),
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.6, rgb, 2, cv2.LINE_AA)
-                    objects.append(f"{color} cube")
-                    centers.append([cx, cy])
-                    cube_boxes.append((x, y, w, h))
+            _, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+            keep = stats[1:][stats[1:, cv2.CC_STAT_AREA] > min_area]  # row 0 is the background
+            names += [f"{color} cube"] * len(keep)
+            boxes.append(keep[:, :4])
+        cube_boxes = np.concatenate(boxes).astype(np.int32) if boxes else np.zeros((0, 4), np.int32)
+        cubes = make_detections(names, "cube", cube_boxes, 1.0)
 
         # --- DETECTING YOLO OBJECTS ---
-        detections = self._yolo_infer(img)
-
-        for (left, top, width, height, score, class_id) in detections:
-            # Get YOLO class name
-            if self.coco_classes and 0 <= class_id < len(self.coco_classes):
-                name = self.coco_classes[class_id]
+        yolo = np.asarray(self._yolo_infer(img), dtype=np.float64).reshape(-1, 6)
+        if not len(yolo):
+            return cubes
+        yolo_boxes = yolo[:, :4].astype(np.int32)
+
+        # --- FILTER: skip YOLO objects whose center lies inside, or whose box mostly overlaps, a cube box ---
+        if len(cube_boxes):
+            cx = (yolo_boxes[:, 0] + yolo_boxes[:, 2] // 2)[:, None]
+            cy = (yolo_boxes[:, 1] + yolo_boxes[:, 3] // 2)[:, None]
+            x, y, w, h = (cube_boxes[:, i][None, :] for i in range(4))
+            inside = (x - center_threshold <= cx) & (cx <= x + w + center_threshold) & \
+                     (y - center_threshold <= cy) & (cy <= y + h + center_threshold)
+            overlap = inside | (box_iou(yolo_boxes, cube_boxes) >= iou_threshold)
+            keep = ~overlap.any(axis=1)
+            yolo, yolo_boxes = yolo[keep], yolo_boxes[keep]
+
+        objects = make_detections([self._class_name(int(c)) for c in yolo[:, 5]], "yolo", yolo_boxes, yolo[:, 4])
+        return np.concatenate([cubes, objects])
+
+    def draw_detections(self, img, detections):
+        """Return an annotated copy of img; only needed when someone is looking at it."""
+        annotated_frame = img.copy()
+        for det in detections:
+            x, y, w, h = (int(v) for v in det["box"])
+            cx, cy = (int(v) for v in det["center"])
+            if det["kind"] == "cube":
+                rgb = self.colors[det["name"].replace(" cube", "")]
             else:
-                name = f"class_{class_id}"
-
-            cx, cy = left + width // 2, top + height // 2
-
-            # --- FILTER: skip YOLO objects whose center lies inside any cube bounding box ---
-            skip = False
-            for (x, y, w, h) in cube_boxes:
-                if (x - center_threshold) <= cx <= (x + w + center_threshold) and \
-                (y - center_threshold) <= cy <= (y + h + center_threshold):
-                    skip = True
-                    break
-
-            if skip:
-                continue  # skip YOLO detection inside a cube region
-
-            # Draw YOLO detection
-            cv2.rectangle(annotated_frame, (left, top), (left + width, top + height), (0, 255, 255), 2)
+                rgb = (0, 255, 255)
+            cv2.rectangle(annotated_frame, (x, y), (x + w, y + h), rgb, 2)
             cv2.circle(annotated_frame, (cx, cy), 3, (255, 255, 255), -1)
-            cv2.putText(annotated_frame, f"{name}", (left, max(0, top - 6)),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2, cv2.LINE_AA)
+            cv2.putText(annotated_frame, str(det["name"]), (x, max(0, y - 6)),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, rgb, 2, cv2.LINE_AA)
+        return annotated_frame
 
-            objects.append(name)
-            centers.append([cx, cy])
+    def detect_objects(self, img, center_threshold=2):
+        detections = self.detect(img, center_threshold)
+        objects = detections["name"].tolist()
+        centers = detections["center"].tolist()
+        return objects, centers, self.draw_detections(img, detections)
 
-        return objects, centers, annotated_frame
 
+    def verify_grasp(self, img, detection, margin=0.5, move_tolerance=0.25, min_area=None):
+        """
+        Check only the region around a picked object's last known box instead of re-detecting the workspace.
+        Returns (status, detection) with status one of:
+          "success"   - the object is gone (detection is None)
+          "failed"    - it is still where it was
+          "moved"     - it is still in the region but displaced
+          "ambiguous" - the local check cannot tell; run detect() on the full frame
+        detection is one row of detect(); for "failed"/"moved" the returned row carries the updated center and box.
+        min_area defaults to the same cube area threshold as detect().
+        """
+        min_area = self.MIN_CUBE_AREA if min_area is None else min_area
+        size = int(max(detection["box"][2:]))
+        H, W = img.shape[:2]
+        x0, y0, x1, y1 = self._grasp_roi(detection, margin)
+        x0, y0, x1, y1 = max(0, x0), max(0, y0), min(W, x1), min(H, y1)
+        roi = img[y0:y1, x0:x1]
+        if roi.size == 0:
+            return "ambiguous", None
+
+        if detection["kind"] == "cube":
+            lower, upper = self.HSV[detection["name"].replace(" cube", "")]
+            mask = cv2.inRange(cv2.cvtColor(roi, cv2.COLOR_BGR2HSV), lower, upper)
+            n, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+            if n <= 1:
+                return "success", None
+            best = 1 + int(np.argmax(stats[1:, cv2.CC_STAT_AREA]))
+            area = int(stats[best, cv2.CC_STAT_AREA])
+            if area < min_area // 4:
+                return "success", None  # colour noise, no cube left
+            if area <= min_area:
+                return "ambiguous", None  # partly occluded / out of view
+            bx, by, bw, bh = (int(v) for v in stats[best, :4])
+        else:
+            matches = [d for d in self._yolo_infer(roi) if self._class_name(d[5]) == detection["name"]]
+            if not matches:
+                return "success", None
+            bx, by, bw, bh = (int(v) for v in max(matches, key=lambda d: d[4])[:4])
+
+        # A blob cut by the ROI edge (inside the image) may extend further than we can see
+        if (bx <= 0 and x0 > 0) or (by <= 0 and y0 > 0) or \
+           (bx + bw >= x1 - x0 and x1 < W) or (by + bh >= y1 - y0 and y1 < H):
+            return "ambiguous", None
+
+        updated = make_detections([detection["name"]], detection["kind"], [(x0 + bx, y0 + by, bw, bh)],
+                                  detection["score"])[0]
+        if np.hypot(*(updated["center"] - detection["center"])) <= move_tolerance * size:
+            return "failed", updated
+        return "moved", updated
+
+    def relocate(self, detections, detection, margin=0.5, move_tolerance=0.25):
+        """
+        Settle an "ambiguous" verify_grasp() from a full detect() of the new frame.
+        Only a same-name detection centered inside the region verify_grasp() examined is taken
+        to be the picked object; one further away is a neighbour, so the pick counts as a success.
+        Returns (status, detection) like verify_grasp(), never "ambiguous".
+        """
+        x0, y0, x1, y1 = self._grasp_roi(detection, margin)
+        cx, cy = detections["center"][:, 0], detections["center"][:, 1]
+        near = detections[(detections["name"] == detection["name"]) &
+                          (cx >= x0) & (cx < x1) & (cy >= y0) & (cy < y1)]
+        if not len(near):
+            return "success", None
+        dist = np.hypot(*(near["center"] - detection["center"]).T)
+        best = int(np.argmin(dist))
+        if dist[best] <= move_tolerance * int(max(detection["box"][2:])):
+            return "failed", near[best]
+        return "moved", near[best]
+
+    def _grasp_roi(self, detection, margin):
+        """(x0, y0, x1, y1) around a detection's box, unclipped; the region verify_grasp() looks at."""
+        x, y, w, h = (int(v) for v in detection["box"])
+        size = max(w, h)
+        pad = int(size * margin) if detection["kind"] == "cube" else int(size * 2 * margin)  # YOLO needs context
+        return x - pad, y - pad, x + w + pad, y + h + pad
 
     def pixel_to_robot_xy(self, x, y):
         if self.M is None:
@@ -283,53 +441,15 @@ class CubePicker:
             raise RuntimeError("Failed to compute affine transform.")
         self.M = M
     
-    def _yolo_blob(self, img):
-        # Letterbox-free simple resize; YOLOv5 ONNX exported head expects 640x640
-        blob = cv2.dnn.blobFromImage(
-            img, scalefactor=1/255.0, size=(self.INPUT_WIDTH, self.INPUT_HEIGHT),
-            mean=(0,0,0), swapRB=True, crop=False
-        )
-        return blob
+    def _class_name(self, class_id):
+        # Get YOLO class name
+        if self.coco_classes and 0 <= class_id < len(self.coco_classes):
+            return self.coco_classes[class_id]
+        return f"class_{class_id}"
 
     def _yolo_infer(self, img):
         """
         Returns list of (left, top, width, height, confidence, class_id)
         in original image coordinates, after NMS.
         """
-        h, w = img.shape[:2]
-        blob = self._yolo_blob(img)
-        self.yolo_net.setInput(blob)
-        outs = self.yolo_net.forward(self.yolo_net.getUnconnectedOutLayersNames())
-        # YOLOv5 ONNX: outs[0] shape [1, N, 85]
-        detections = outs[0][0]
-        boxes, scores, class_ids = [], [], []
-
-        x_factor = w / self.INPUT_WIDTH
-        y_factor = h / self.INPUT_HEIGHT
-
-        for det in detections:
-            obj_conf = float(det[4])
-            if obj_conf < self.CONFIDENCE_THRESHOLD:
-                continue
-            class_scores = det[5:]
-            cid = int(np.argmax(class_scores))
-            cls_score = float(class_scores[cid])
-            if cls_score < self.SCORE_THRESHOLD:
-                continue
-
-            cx, cy, bw, bh = det[0], det[1], det[2], det[3]
-            left   = int((cx - bw/2) * x_factor)
-            top    = int((cy - bh/2) * y_factor)
-            width  = int(bw * x_factor)
-            height = int(bh * y_factor)
-
-            boxes.append([left, top, width, height])
-            scores.append(obj_conf * cls_score)
-            class_ids.append(cid)
-
-        if not boxes:
-            return []
-
-        idxs = cv2.dnn.NMSBoxes(boxes, scores, self.CONFIDENCE_THRESHOLD, self.NMS_THRESHOLD)
-        idxs = idxs.flatten().tolist() if len(idxs) else []
-        return [(boxes[i][0], boxes[i][1], boxes[i][2], boxes[i][3], scores[i], class_ids[i]) for i in idxs]
+        return self.yolo.infer(img)
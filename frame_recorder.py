@@ -0,0 +1,269 @@
+import argparse
+import json
+import os
+import struct
+import time as t
+
+import cv2
+import numpy as np
+
+
+# ============================
+# Session file format
+# ============================
+# <header: 32 bytes> <record 0> <record 1> ...
+#
+# header : magic(8) version(u32) height(u32) width(u32) channels(u32) reserved(8)
+# record : timestamp(f64, seconds since epoch) + frame(uint8[height, width, channels])
+#
+# Records are fixed size, so the file is only ever appended to and can be
+# memory-mapped as a single structured array for replay. Ground-truth labels
+# live in a JSON-lines sidecar (<session>.labels.jsonl), one line per
+# labelled frame: {"index": i, "objects": [{"name": ..., "center": [x, y]}, ...]}
+# Label centers are pixels of the stored frame itself, i.e. the full rotated
+# camera frame, not the cropped and scaled view detect() works on (the crop is
+# only known after calibration).
+
+MAGIC = b"CPFRAMES"
+VERSION = 1
+_HEADER = struct.Struct("<8sIIII8x")
+
+
+def record_dtype(height, width, channels=3):
+    return np.dtype([("timestamp", "<f8"), ("frame", np.uint8, (height, width, channels))])
+
+
+def labels_path(path):
+    return path + ".labels.jsonl"
+
+
+def read_labels(path):
+    """Returns {frame_index: [{"name": ..., "center": [x, y]}, ...]} for a session (empty if unlabelled)."""
+    labels = {}
+    lp = labels_path(path)
+    if not os.path.exists(lp):
+        return labels
+    with open(lp, "r") as f:
+        for ln in f:
+            if not ln.strip():
+                continue
+            entry = json.loads(ln)
+            labels[int(entry["index"])] = entry["objects"]
+    return labels
+
+
+def write_labels(path, labels):
+    """Replace the label sidecar of a session with {frame_index: objects}."""
+    with open(labels_path(path), "w") as f:
+        for idx in sorted(labels):
+            f.write(json.dumps({"index": idx, "objects": labels[idx]}) + "\n")
+
+
+class FrameRecorder:
+    """
+    Appends (already rotated) camera frames to a session file.
+    The frame size is fixed by the first frame written.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.shape = None
+        self.count = 0
+        self._f = None
+        self._labels = None
+
+        if os.path.exists(path) and os.path.getsize(path) >= _HEADER.size:
+            # Continue an existing session
+            with FrameReplay(path) as replay:
+                self.shape = replay.shape
+                self.count = len(replay)
+                size = _HEADER.size + self.count * record_dtype(*self.shape).itemsize
+            # Drop a partial trailing record so appends stay aligned
+            with open(path, "r+b") as f:
+                f.truncate(size)
+            self._f = open(path, "ab")
+
+    def append(self, frame, labels=None, timestamp=None):
+        """
+        Write one frame. labels is an optional list of {"name", "center"} dicts
+        describing the ground truth for this frame, with centers in pixels of
+        the frame as written. Returns the frame index.
+        """
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)
+        if frame.ndim == 2:
+            frame = frame[:, :, None]
+
+        if self._f is None:
+            self.shape = frame.shape
+            self._f = open(self.path, "wb")
+            self._f.write(_HEADER.pack(MAGIC, VERSION, *self.shape))
+        elif frame.shape != self.shape:
+            raise ValueError(f"Frame shape {frame.shape} does not match session shape {self.shape}.")
+
+        ts = t.time() if timestamp is None else timestamp
+        self._f.write(struct.pack("<d", ts))
+        self._f.write(frame.tobytes())
+
+        if labels is not None:
+            if self._labels is None:
+                self._labels = open(labels_path(self.path), "a")
+            self._labels.write(json.dumps({"index": self.count, "objects": labels}) + "\n")
+
+        self.count += 1
+        return self.count - 1
+
+    def flush(self):
+        if self._f is not None:
+            self._f.flush()
+        if self._labels is not None:
+            self._labels.flush()
+
+    def close(self):
+        for f in (self._f, self._labels):
+            if f is not None:
+                f.close()
+        self._f = self._labels = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FrameReplay:
+    """
+    Memory-mapped replay of a recorded session with the subset of the
+    cv2.VideoCapture API used by CubePicker (read/grab/isOpened/release).
+
+    realtime=True paces frames at the recorded rate, otherwise frames are
+    returned as fast as they are requested. Recorded frames are already
+    rotated, so set picker.frame_rotation = None when replaying into a picker.
+    """
+
+    def __init__(self, path, realtime=False, loop=False, copy=True):
+        self.path = path
+        self.realtime = realtime
+        self.loop = loop
+        self.copy = copy
+        self.position = 0
+        self._t0 = None
+
+        with open(path, "rb") as f:
+            magic, version, h, w, c = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a frame recording.")
+        if version != VERSION:
+            raise ValueError(f"Unsupported recording version {version}.")
+
+        self.shape = (h, w, c)
+        dtype = record_dtype(h, w, c)
+        # A trailing partial record (recorder killed mid-write) is ignored
+        n = (os.path.getsize(path) - _HEADER.size) // dtype.itemsize
+        if n > 0:
+            self._records = np.memmap(path, dtype=dtype, mode="r", offset=_HEADER.size, shape=(n,))
+        else:
+            self._records = np.zeros(0, dtype=dtype)
+        self.timestamps = self._records["timestamp"]
+
+    def __len__(self):
+        return len(self._records)
+
+    def __getitem__(self, idx):
+        return self._records[idx]["frame"]
+
+    @property
+    def fps(self):
+        """Native frame rate of the recording."""
+        if len(self) < 2:
+            return 0.0
+        span = float(self.timestamps[-1] - self.timestamps[0])
+        return (len(self) - 1) / span if span > 0 else 0.0
+
+    # ---------- cv2.VideoCapture-like API ----------
+    def isOpened(self):
+        return self._records is not None
+
+    def grab(self):
+        if self._records is None:
+            return False
+        if self.position >= len(self):
+            if not self.loop or len(self) == 0:
+                return False
+            self.position = 0
+            self._t0 = None
+        self._pace()
+        self.position += 1
+        return True
+
+    def retrieve(self):
+        if self._records is None or self.position == 0:
+            return False, None
+        frame = self[self.position - 1]
+        return True, (np.array(frame) if self.copy else frame)
+
+    def read(self):
+        if not self.grab():
+            return False, None
+        return self.retrieve()
+
+    def release(self):
+        self._records = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    # ---------- helpers (internal) ----------
+    def _pace(self):
+        if not self.realtime:
+            return
+        ts = float(self.timestamps[self.position])
+        now = t.perf_counter()
+        if self._t0 is None:
+            self._t0 = now - (ts - float(self.timestamps[0]))
+        delay = (ts - float(self.timestamps[0])) - (now - self._t0)
+        if delay > 0:
+            t.sleep(delay)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record rotated camera frames to a session file.")
+    parser.add_argument("output", help="session file to write (appended to if it exists)")
+    parser.add_argument("--camera", type=int, default=0, help="camera index")
+    parser.add_argument("--frames", type=int, default=0, help="stop after N frames (0 = until ESC / Ctrl-C)")
+    parser.add_argument("--no-preview", action="store_true", help="do not show a preview window")
+    args = parser.parse_args()
+
+    cap = cv2.VideoCapture(args.camera)
+    if not cap.isOpened():
+        cap.open(args.camera)
+
+    recorder = FrameRecorder(args.output)
+    print(f"[RECORD] Writing to {args.output} (starting at frame {recorder.count})")
+    try:
+        while args.frames <= 0 or recorder.count < args.frames:
+            ok, frame = cap.read()
+            if not ok:
+                continue
+            frame = cv2.rotate(frame, cv2.ROTATE_180)
+            recorder.append(frame)
+
+            if not args.no_preview:
+                cv2.imshow("Recording", frame)
+                if cv2.waitKey(1) & 0xFF == 27:  # ESC
+                    break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        recorder.close()
+        cap.release()
+        if not args.no_preview:
+            cv2.destroyAllWindows()
+    print(f"[RECORD] {recorder.count} frames in {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,397 @@
+import argparse
+import json
+import os
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time as t
+
+import numpy as np
+from multiprocessing import shared_memory, resource_tracker
+
+
+DEFAULT_ADDRESS = "/tmp/cube_picker_yolo.sock"
+
+# ============================
+# Wire protocol
+# ============================
+# Every message is <u32 header length><JSON header>[<payload>], where the
+# payload (raw frame bytes) is present only if header["nbytes"] > 0.
+#
+# client -> server
+#   {"op": "hello", "client": "<name>"}
+#   {"op": "infer", "shape": [h, w, c], "shm": "<segment name>" | null, "nbytes": n}
+#   {"op": "stats"}
+# server -> client
+#   {"ok": true, ...}  /  {"ok": false, "error": "<message>"}
+#
+# Same-host clients on a Unix socket place frames in a shared-memory segment
+# and only send its name; TCP clients send the frame bytes inline.
+
+_LEN = struct.Struct("!I")
+
+
+def _send_msg(sock, header, payload=b""):
+    data = json.dumps(header).encode()
+    sock.sendall(_LEN.pack(len(data)) + data)
+    if payload:
+        sock.sendall(payload)
+
+
+def _recv_exact(sock, n):
+    buf = bytearray(n)
+    view = memoryview(buf)
+    got = 0
+    while got < n:
+        k = sock.recv_into(view[got:], n - got)
+        if k == 0:
+            raise ConnectionError("Connection closed.")
+        got += k
+    return buf
+
+
+def _recv_msg(sock):
+    (n,) = _LEN.unpack(_recv_exact(sock, _LEN.size))
+    header = json.loads(_recv_exact(sock, n))
+    payload = _recv_exact(sock, header["nbytes"]) if header.get("nbytes") else None
+    return header, payload
+
+
+def _parse_address(address):
+    """'host:port' -> (AF_INET, (host, port)); anything else is a Unix socket path."""
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit() and "/" not in address:
+        return socket.AF_INET, (host or "127.0.0.1", int(port))
+    return socket.AF_UNIX, address
+
+
+def _attach_shm(name):
+    """Attach to a client's segment without letting this process's resource tracker unlink it."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+# ============================
+# Server
+# ============================
+class ClientStats:
+    """Per-client counters, reported by the "stats" op."""
+
+    def __init__(self, name):
+        self.name = name
+        self.connected_at = t.time()
+        self.frames = 0
+        self.latency_sum = 0.0
+        self.last_latency = 0.0
+        self.batch_sum = 0
+        self.pending = 0
+
+    def as_dict(self):
+        up = max(t.time() - self.connected_at, 1e-9)
+        return {
+            "client": self.name,
+            "frames": self.frames,
+            "fps": self.frames / up,
+            "mean_latency_ms": 1000.0 * self.latency_sum / self.frames if self.frames else 0.0,
+            "last_latency_ms": 1000.0 * self.last_latency,
+            "mean_batch": self.batch_sum / self.frames if self.frames else 0.0,
+            "queue_depth": self.pending,
+        }
+
+
+class _ReusableTCPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True  # restart right away instead of waiting out TIME_WAIT
+
+
+class _Request:
+    def __init__(self, frame, stats):
+        self.frame = frame
+        self.stats = stats
+        self.arrived = t.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class InferenceServer:
+    """
+    Shares one YOLO model between many picker cells. Frames from all
+    connected clients are collected into a batch that is run as soon as it
+    holds max_batch frames or its oldest frame has waited max_latency seconds.
+    """
+
+    def __init__(self, detector, address=DEFAULT_ADDRESS, max_batch=8, max_latency=0.010):
+        self.detector = detector
+        self.address = address
+        self.max_batch = max_batch
+        self.max_latency = max_latency
+
+        self.queue = queue.Queue()
+        self.clients = {}
+        self.lock = threading.Lock()
+        self.batches = 0
+        self._stop = threading.Event()
+        self._server = None
+
+    # ---------------------------------------------------------
+    # Public API
+    # ---------------------------------------------------------
+    def serve_forever(self, stats_interval=0):
+        family, addr = _parse_address(self.address)
+        handler = self._make_handler()
+        if family == socket.AF_UNIX:
+            if os.path.exists(addr):
+                os.unlink(addr)
+            self._server = socketserver.ThreadingUnixStreamServer(addr, handler)
+        else:
+            self._server = _ReusableTCPServer(addr, handler)
+        self._server.daemon_threads = True
+
+        threading.Thread(target=self._batch_loop, daemon=True).start()
+        if stats_interval > 0:
+            threading.Thread(target=self._stats_loop, args=(stats_interval,), daemon=True).start()
+
+        print(f"[INFER] Serving {self.detector.onnx_path} on {self.address} "
+              f"(max batch {self.max_batch}, max latency {self.max_latency * 1000:.1f} ms)")
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            if family == socket.AF_UNIX and os.path.exists(addr):
+                os.unlink(addr)
+
+    def shutdown(self):
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+
+    def stats(self):
+        with self.lock:
+            clients = [s.as_dict() for s in self.clients.values()]
+        return {"queue_depth": self.queue.qsize(), "batches": self.batches, "clients": clients}
+
+    # ---------------------------------------------------------
+    # Batching
+    # ---------------------------------------------------------
+    def _batch_loop(self):
+        while not self._stop.is_set():
+            try:
+                first = self.queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            batch = [first]
+            deadline = first.arrived + self.max_latency
+            while len(batch) < self.max_batch:
+                remaining = deadline - t.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        try:
+            results = self.detector.infer_batch([r.frame for r in batch])
+        except Exception as e:
+            results = None
+            error = str(e)
+
+        now = t.perf_counter()
+        with self.lock:
+            self.batches += 1
+            for i, req in enumerate(batch):
+                if results is None:
+                    req.error = error
+                else:
+                    req.result = results[i]
+                req.frame = None  # drop shared-memory views before the client reuses its segment
+                latency = now - req.arrived
+                s = req.stats
+                s.frames += 1
+                s.latency_sum += latency
+                s.last_latency = latency
+                s.batch_sum += len(batch)
+                s.pending -= 1
+        for req in batch:
+            req.done.set()
+
+    def _stats_loop(self, interval):
+        while not self._stop.wait(interval):
+            st = self.stats()
+            print(f"[INFER] batches={st['batches']} queue={st['queue_depth']}")
+            for c in st["clients"]:
+                print(f"[INFER]   {c['client']}: {c['fps']:.1f} fps, "
+                      f"{c['mean_latency_ms']:.1f} ms mean, batch {c['mean_batch']:.1f}, queue {c['queue_depth']}")
+
+    # ---------------------------------------------------------
+    # Connections
+    # ---------------------------------------------------------
+    def _make_handler(self):
+        server = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                server._handle_client(self.request, self.client_address)
+
+        return Handler
+
+    def _handle_client(self, sock, peer):
+        stats = ClientStats(str(peer) if peer else f"client-{id(sock):x}")
+        segments = {}
+        with self.lock:
+            self.clients[id(sock)] = stats
+        try:
+            while True:
+                try:
+                    header, payload = _recv_msg(sock)
+                except (ConnectionError, OSError):
+                    break
+
+                op = header.get("op")
+                if op == "hello":
+                    stats.name = header.get("client") or stats.name
+                    _send_msg(sock, {"ok": True})
+                elif op == "stats":
+                    _send_msg(sock, {"ok": True, **self.stats()})
+                elif op == "infer":
+                    try:
+                        req = _Request(self._frame_from(header, payload, segments), stats)
+                    except (ValueError, OSError) as e:
+                        _send_msg(sock, {"ok": False, "error": str(e)})
+                        continue
+                    with self.lock:
+                        stats.pending += 1
+                    self.queue.put(req)
+                    req.done.wait()
+                    if req.error is not None:
+                        _send_msg(sock, {"ok": False, "error": req.error})
+                    else:
+                        dets = [[int(l), int(tp), int(w), int(h), float(s), int(c)] for l, tp, w, h, s, c in req.result]
+                        _send_msg(sock, {"ok": True, "detections": dets})
+                else:
+                    _send_msg(sock, {"ok": False, "error": f"Unknown op {op!r}"})
+        finally:
+            with self.lock:
+                self.clients.pop(id(sock), None)
+            for shm in segments.values():
+                shm.close()
+
+    def _frame_from(self, header, payload, segments):
+        shape = tuple(header["shape"])
+        size = int(np.prod(shape))
+        name = header.get("shm")
+        if name:
+            shm = segments.get(name)
+            if shm is None:
+                # A new name means the client replaced (and unlinked) its segment; unmap the old one
+                for stale in segments.values():
+                    stale.close()
+                segments.clear()
+                shm = segments[name] = _attach_shm(name)
+            if shm.size < size:
+                raise ValueError("Shared-memory segment is smaller than the frame.")
+            # The client blocks until it gets the reply, so the view stays valid for the forward pass
+            return np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+        if payload is None or len(payload) != size:
+            raise ValueError("Frame payload does not match its shape.")
+        return np.frombuffer(payload, dtype=np.uint8).reshape(shape)
+
+
+# ============================
+# Client
+# ============================
+class InferenceClient:
+    """
+    Connection to an InferenceServer with the same infer() interface as
+    YoloDetector, so a CubePicker can use either.
+    """
+
+    def __init__(self, address=DEFAULT_ADDRESS, name=None, use_shm=None):
+        family, addr = _parse_address(address)
+        self.sock = socket.socket(family, socket.SOCK_STREAM)
+        self.sock.connect(addr)
+        if family == socket.AF_INET:
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.use_shm = (family == socket.AF_UNIX) if use_shm is None else use_shm
+        self.shm = None
+        self.lock = threading.Lock()
+
+        self._call({"op": "hello", "client": name or f"{socket.gethostname()}:{os.getpid()}"})
+
+    def infer(self, img):
+        """
+        Returns list of (left, top, width, height, confidence, class_id)
+        in original image coordinates, after NMS.
+        """
+        img = np.ascontiguousarray(img, dtype=np.uint8)
+        header = {"op": "infer", "shape": list(img.shape)}
+        with self.lock:
+            if self.use_shm:
+                if self.shm is None or self.shm.size < img.nbytes:
+                    self._release_shm()
+                    self.shm = shared_memory.SharedMemory(create=True, size=img.nbytes)
+                np.ndarray(img.shape, dtype=np.uint8, buffer=self.shm.buf)[...] = img
+                header["shm"] = self.shm.name
+                reply = self._call(header)
+            else:
+                header["nbytes"] = img.nbytes
+                reply = self._call(header, img.tobytes())
+        return [tuple(d) for d in reply["detections"]]
+
+    def stats(self):
+        with self.lock:
+            return self._call({"op": "stats"})
+
+    def close(self):
+        with self.lock:
+            try:
+                self.sock.close()
+            finally:
+                self._release_shm()
+
+    # ---------- helpers (internal) ----------
+    def _call(self, header, payload=b""):
+        _send_msg(self.sock, header, payload)
+        reply, _ = _recv_msg(self.sock)
+        if not reply.get("ok"):
+            raise RuntimeError(f"Inference server error: {reply.get('error')}")
+        return reply
+
+    def _release_shm(self):
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+
+def main():
+    from yolo_detector import YoloDetector
+
+    default_root = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Shared batched YOLO inference server for picker cells.")
+    parser.add_argument("--address", default=DEFAULT_ADDRESS, help="Unix socket path or host:port")
+    parser.add_argument("--yolo", default=os.path.join(default_root, "yolov5s.onnx"), help="path to yolov5s.onnx")
+    parser.add_argument("--max-batch", type=int, default=8)
+    parser.add_argument("--max-latency-ms", type=float, default=10.0,
+                        help="longest a frame waits for its batch to fill")
+    parser.add_argument("--stats-interval", type=float, default=0, help="print client stats every N s (0 = off)")
+    args = parser.parse_args()
+
+    server = InferenceServer(YoloDetector(args.yolo), args.address,
+                             max_batch=args.max_batch, max_latency=args.max_latency_ms / 1000.0)
+    try:
+        server.serve_forever(stats_interval=args.stats_interval)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
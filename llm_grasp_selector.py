@@ -7,10 +7,11 @@ from llm_agent import LLM_Agent
 class LLMGraspSelector:
     """Handler for LLM-based object selection for grasping using a custom LLM_Agent."""
 
-    def __init__(self):
+    def __init__(self, url="http://172.27.15.38:11434/api/generate"):
         """
         Initialize the custom LLM agent instead of OpenAI/OpenRouter.
         system_prompt remains identical to your original prompt.
+        url: Ollama-style /api/generate endpoint of the LLM host
         """
 
         system_prompt = """You are a robotic assistant that helps select objects for grasping.
@@ -55,7 +56,7 @@ Do not include any additional text outside the JSON object.
         # Build Hydra/OmegaConf config object to pass to LLM_Agent
         llm_cfg = DictConfig({
             "model_name": "phi4:latest",
-            "url": "http://172.27.15.38:11434/api/generate",
+            "url": url,
             "max_retries": 3,
             "system_prompt": system_prompt
         })
@@ -65,14 +66,17 @@ Do not include any additional text outside the JSON object.
 
 
     def select_objects(self, objects, centers, user_command):
-        """Use your custom LLM_Agent to select objects."""
+        """
+        Use your custom LLM_Agent to select objects.
+        Always returns (response to speak, [(name, center), ...]); the action list may be empty.
+        """
 
         if len(objects) != len(centers):
             raise ValueError("objects and centers lists must have the same length")
 
         if not objects:
             print("No objects detected!")
-            return []
+            return "I did not detect any objects.", []
 
         available_objects = [
             {"index": i, "color": color, "center": center}
@@ -97,7 +101,7 @@ Which object(s) should be grasped and in what order?
 
         except Exception as e:
             print(f"[ERROR] LLM failed: {e}")
-            return []
+            return "Sorry, I could not work out which objects to pick.", []
 
 
         # --- Extract fields ---
@@ -112,7 +116,7 @@ Which object(s) should be grasped and in what order?
         # No actions selected
         if not actions:
             print("[INFO] No valid objects selected")
-            return []
+            return user_response, []
 
         selected_actions = []
 
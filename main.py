@@ -1,21 +1,142 @@
+import argparse
 import cv2
+import numpy as np
+import os
+import signal
+import sys
+import threading
 import time as t
 from cube_picker import CubePicker
 from llm_grasp_selector import LLMGraspSelector
-from vosk_stt import VoskSTT
-from tts import BlockingTTS
+from mjpeg_preview import MJPEGPreview
+
+
+class HeadlessTrigger:
+    """Detection/quit requests for the headless control loop."""
+
+    def __init__(self):
+        self.detect_request = threading.Event()
+        self.quit_request = threading.Event()
+
+    def request(self, quit=False):
+        if quit:
+            self.quit_request.set()
+        self.detect_request.set()
+
+    def poll(self, timeout):
+        """Returns "detect", "quit" or None if nothing was requested within timeout seconds."""
+        if not self.detect_request.wait(timeout):
+            return None
+        if self.quit_request.is_set():
+            return "quit"  # keep detect_request set so every later poll() quits too
+        self.detect_request.clear()
+        return "detect"
+
+
+class StdinTrigger(HeadlessTrigger):
+    """Enter starts a detection; 'q' or the end of stdin quits."""
+
+    def __init__(self):
+        super().__init__()
+        threading.Thread(target=self._watch, daemon=True).start()
+
+    def _watch(self):
+        for line in sys.stdin:
+            if line.strip().lower() in ['quit', 'exit', 'q']:
+                break
+            self.request()
+        # Also reached at EOF (stdin from /dev/null, nohup, systemd): nothing can trigger a detection any more
+        self.request(quit=True)
+
+
+class SignalTrigger(HeadlessTrigger):
+    """For cells without a terminal: SIGUSR1 starts a detection, SIGTERM quits."""
+
+    def __init__(self):
+        super().__init__()
+        signal.signal(signal.SIGUSR1, lambda *_: self._from_handler(False))
+        signal.signal(signal.SIGTERM, lambda *_: self._from_handler(True))
+
+    def _from_handler(self, quit):
+        # The handler runs on the main thread, possibly inside poll()'s Event.wait(); setting
+        # the event from there could deadlock on its lock, so hand the request to a thread
+        threading.Thread(target=self.request, args=(quit,), daemon=True).start()
+
+
+def find_detection(detections, obj, center):
+    """The detection the LLM picked: same name, nearest to the returned center."""
+    candidates = detections[detections["name"] == obj]
+    if not len(candidates):
+        return None
+    dist = ((candidates["center"] - np.asarray(center)) ** 2).sum(axis=1)
+    return candidates[int(np.argmin(dist))]
+
 
 def main():
-    picker = CubePicker(camera_index=0)
-    stt = VoskSTT()
-    tts = BlockingTTS()
+    parser = argparse.ArgumentParser(description="Voice/LLM driven pick-and-place.")
+    parser.add_argument("--headless", action="store_true",
+                        help="no windows and no annotation; press Enter in the terminal to start a detection")
+    parser.add_argument("--preview-port", type=int, default=None,
+                        help="serve an MJPEG preview on http://127.0.0.1:<port>/")
+    parser.add_argument("--preview-fps", type=float, default=10)
+    parser.add_argument("--trigger", choices=["stdin", "signal"], default="stdin",
+                        help="headless detection trigger: Enter/'q' on stdin, or SIGUSR1/SIGTERM "
+                             "(for cells run without a terminal, e.g. under systemd)")
+    parser.add_argument("--sim", default=None, metavar="CONFIG",
+                        help="run on the simulated drivers described by this YAML file (see sim.yaml); implies --headless")
+    args = parser.parse_args()
+
+    sim = None
+    if args.sim:
+        from sim_drivers import SimSession
+        sim = SimSession.from_yaml(args.sim)
+        sim.clock.install(sys.modules[__name__])
+        picker, stt, tts, selector, trigger = sim.picker, sim.stt, sim.tts, sim.selector, sim.trigger
+        args.headless = True
+    else:
+        # Audio drivers are only importable on a machine with the audio stack installed
+        from vosk_stt import VoskSTT
+        from tts import BlockingTTS
+
+        # Set to a socket path or host:port to share one YOLO model between cells (see inference_server.py)
+        picker = CubePicker(camera_index=0, inference_server=os.environ.get("CUBE_PICKER_INFERENCE_SERVER"))
+        stt = VoskSTT()
+        tts = BlockingTTS()
+        try:
+            selector = LLMGraspSelector()
+        except ValueError as e:
+            print(f"[ERROR] {e}")
+            print("\nPlease set your OpenRouter API key:")
+            print("  export OPENROUTER_API_KEY='your-api-key-here'")
+            return
+        trigger = None
+        if args.headless:
+            trigger = SignalTrigger() if args.trigger == "signal" else StdinTrigger()
+
+    preview = None
+    if args.preview_port:
+        preview = MJPEGPreview(port=args.preview_port, max_fps=args.preview_fps,
+                               render=picker.draw_detections).start()
+
     try:
-        selector = LLMGraspSelector()
-    except ValueError as e:
-        print(f"[ERROR] {e}")
-        print("\nPlease set your OpenRouter API key:")
-        print("  export OPENROUTER_API_KEY='your-api-key-here'")
-        return
+        run(picker, stt, tts, selector, headless=args.headless, trigger=trigger, preview=preview)
+    finally:
+        if preview is not None:
+            preview.close()
+        if sim is not None:
+            sim.close()
+
+
+def run(picker, stt, tts, selector, headless=False, trigger=None, preview=None):
+    """The pick-and-place control loop; trigger is required when headless."""
+
+    def show(window, frame, detections=None):
+        # Annotation is only rendered for a window or an attached preview viewer
+        if preview is not None:
+            preview.publish(frame, detections)
+        if not headless:
+            cv2.imshow(window, picker.draw_detections(frame, detections) if detections is not None else frame)
+            cv2.waitKey(1)
 
     try:
         print("Initializing…")
@@ -27,33 +148,33 @@ def main():
         tts.speak("Ready to detect objects")
         detect = False
         while True:
-            ok, frame = picker.cap.read()
+            ok, frame = picker.read_frame()
             if not ok:
                 continue
-            
-            frame = cv2.rotate(frame, cv2.ROTATE_180)
+
             frame = picker.crop_frame(frame)
 
             if detect:
-                objects, centers, annotated_frame = picker.detect_objects(frame)
-                
-                cv2.imshow("Detection", annotated_frame)
-                cv2.waitKey(1)
+                detections = picker.detect(frame)
+                objects = detections["name"].tolist()
+                centers = detections["center"].tolist()
+
+                show("Detection", frame, detections)
                 print("=== LLM-Based Grasp Selector ===\n")
                 tts.speak(f"I have detected {len(objects)} objects")
-                
+
                 if len(objects) > 0:
                     for idx, (obj, center) in enumerate(zip(objects, centers)):
                         tts.speak(f"A {obj}")
-                    
+
                     tts.speak("Which object or objects do you want to pick?")
                     user_command = stt.speech_to_text_vosk()
                     #user_command = input()
-                
+
                     if user_command.lower() in ['quit', 'exit', 'q']:
                         print("Exiting...")
                         break
-                    
+
                     if not user_command:
                         continue
 
@@ -65,46 +186,71 @@ def main():
                     for idx, (obj, center) in enumerate(actions):
                         print(f"\n--- Step {idx + 1}/{len(actions)} ---")
                         picked = False
+                        target = find_detection(detections, obj, center)
                         while not picked:
                             cx, cy = center
                             X, Y = picker.pixel_to_robot_xy(cx, cy)
                             picker.grasp(X, Y, obj)
-                        
+
                             # CHECK IF OBJECT WAS ACTUALLY PICKED
                             for _ in range(5):
                                 picker.cap.grab()
-                            
-                            ok, new_frame = picker.cap.read()
+
+                            ok, new_frame = picker.read_frame()
                             if not ok:
                                 continue
-                            
-                            new_frame = cv2.rotate(new_frame, cv2.ROTATE_180)
+
                             new_frame = picker.crop_frame(new_frame)
-                            new_objects, new_centers, new_annotated_frame = picker.detect_objects(new_frame)
-                            cv2.imshow("Detection", new_annotated_frame)
-                            cv2.waitKey(1)
-                            print(f"\n[INFO] Remaining objects after picking: {new_objects}")
-                            
-                            if obj not in new_objects:
-                                tts.speak(f"Succesfully picked {obj}")
+
+                            # Look only around the object's last box; full detection if that is inconclusive
+                            status, found = picker.verify_grasp(new_frame, target) if target is not None else ("ambiguous", None)
+                            if status == "ambiguous":
+                                new_detections = picker.detect(new_frame)
+                                new_objects = new_detections["name"].tolist()
+                                show("Detection", new_frame, new_detections)
+                                print(f"\n[INFO] Remaining objects after picking: {new_objects}")
+                                if target is not None:
+                                    # Same-name objects outside the checked region are neighbours, not this one
+                                    status, found = picker.relocate(new_detections, target)
+                                else:
+                                    found = find_detection(new_detections, obj, center)
+                                    status = "failed" if found is not None else "success"
+                            else:
+                                show("Detection", new_frame, found.reshape(1) if found is not None else None)
+                            print(f"\n[INFO] Grasp check for {obj}: {status}")
+                            target = found
+
+                            if status == "success":
+                                tts.speak(f"Successfully picked {obj}")
                                 picked = True
                             else:
-                                center = new_centers[new_objects.index(obj)]
+                                center = target["center"].tolist()
                                 tts.speak(f"Failed to pick {obj}. Trying again with new center: {center}.")
-                            
+
                             t.sleep(2)
-                    
+
                 tts.speak("Ready to detect objects")
                 detect = False
-            
+
+            if preview is not None:
+                preview.publish(frame)
+
+            if headless:
+                # No waitKey here, so the trigger wait also paces the loop
+                request = trigger.poll(timeout=0.01)
+                if request == "quit":
+                    break
+                if request == "detect":
+                    detect = True
+                continue
+
             cv2.imshow("Camera", frame)
             key = cv2.waitKey(1) & 0xFF
             if key == 27:  # ESC
                 break
-            
+
             if key == ord('s'):
                 detect = True
-                
 
     finally:
         picker.close()
@@ -0,0 +1,139 @@
+import threading
+import time as t
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+
+
+_PAGE = b"""<!doctype html>
+<html><head><title>Cube Picker</title></head>
+<body style="margin:0;background:#222"><img src="/stream" style="max-width:100%"></body></html>
+"""
+
+
+class MJPEGPreview:
+    """
+    Local MJPEG/HTTP preview of the camera feed (http://host:port/).
+
+    publish() is cheap and never blocks the control loop: while nobody is
+    viewing it returns immediately, otherwise it only hands over a reference
+    to the latest frame. Annotation (render callback) and JPEG encoding run on
+    a background thread, at most max_fps times per second.
+    """
+
+    def __init__(self, host="127.0.0.1", port=8080, max_fps=10, quality=80, render=None):
+        self.host = host
+        self.port = port
+        self.max_fps = max_fps
+        self.quality = quality
+        self.render = render  # render(frame, detections) -> annotated frame
+
+        self.viewers = 0
+        self._pending = None   # (frame, detections) not yet encoded
+        self._jpeg = None
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._stop = False
+        self._server = None
+
+    # ---------------------------------------------------------
+    # Public API
+    # ---------------------------------------------------------
+    def start(self):
+        preview = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/":
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/html")
+                    self.send_header("Content-Length", str(len(_PAGE)))
+                    self.end_headers()
+                    self.wfile.write(_PAGE)
+                elif self.path == "/stream":
+                    preview._stream(self)
+                else:
+                    self.send_error(404)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        threading.Thread(target=self._encode_loop, daemon=True).start()
+        print(f"[PREVIEW] http://{self.host}:{self.port}/")
+        return self
+
+    def publish(self, frame, detections=None):
+        """Offer the latest frame (and its detections) to attached viewers. The frame must not be modified afterwards."""
+        if not self.viewers:
+            return
+        with self._cond:
+            self._pending = (frame, detections)
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    # ---------------------------------------------------------
+    # Internal helpers
+    # ---------------------------------------------------------
+    def _encode_loop(self):
+        min_interval = 1.0 / self.max_fps if self.max_fps > 0 else 0.0
+        last = 0.0
+        while True:
+            with self._cond:
+                while self._pending is None and not self._stop:
+                    self._cond.wait()
+                if self._stop:
+                    return
+            # Rate limit; frames published meanwhile replace the pending one
+            delay = last + min_interval - t.perf_counter()
+            if delay > 0:
+                t.sleep(delay)
+            with self._cond:
+                frame, detections = self._pending
+                self._pending = None
+
+            if self.render is not None and detections is not None and len(detections):
+                frame = self.render(frame, detections)
+            ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+            last = t.perf_counter()
+            if not ok:
+                continue
+            with self._cond:
+                self._jpeg = buf.tobytes()
+                self._seq += 1
+                self._cond.notify_all()
+
+    def _stream(self, handler):
+        handler.send_response(200)
+        handler.send_header("Cache-Control", "no-cache")
+        handler.send_header("Content-Type", "multipart/x-mixed-replace; boundary=frame")
+        handler.end_headers()
+
+        with self._cond:
+            self.viewers += 1
+            seen = self._seq
+        try:
+            while True:
+                with self._cond:
+                    while self._seq == seen and not self._stop:
+                        self._cond.wait()
+                    if self._stop:
+                        return
+                    jpeg, seen = self._jpeg, self._seq
+                handler.wfile.write(b"--frame\r\nContent-Type: image/jpeg\r\n")
+                handler.wfile.write(f"Content-Length: {len(jpeg)}\r\n\r\n".encode())
+                handler.wfile.write(jpeg + b"\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            with self._cond:
+                self.viewers -= 1
@@ -0,0 +1,172 @@
+import argparse
+import json
+import time as t
+
+import numpy as np
+
+from cube_picker import CubePicker
+from frame_recorder import FrameReplay, read_labels, write_labels
+
+
+class StageTimer:
+    """Collects per-stage latencies (seconds) over a benchmark run."""
+
+    def __init__(self):
+        self.samples = {}
+
+    def add(self, stage, seconds):
+        self.samples.setdefault(stage, []).append(seconds)
+
+    def wrap(self, stage, fn):
+        def timed(*args, **kwargs):
+            start = t.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.add(stage, t.perf_counter() - start)
+        return timed
+
+    def summary(self):
+        out = {}
+        for stage, vals in self.samples.items():
+            ms = np.asarray(vals) * 1000.0
+            out[stage] = {
+                "count": len(ms),
+                "mean_ms": float(ms.mean()),
+                "p50_ms": float(np.percentile(ms, 50)),
+                "p95_ms": float(np.percentile(ms, 95)),
+                "max_ms": float(ms.max()),
+            }
+        return out
+
+
+def match_detections(objects, centers, truth, tolerance):
+    """
+    Greedy match of detections against ground truth by name and center distance.
+    Returns (matched, missed, extra).
+    """
+    unmatched = list(range(len(objects)))
+    matched = 0
+    for gt in truth:
+        best, best_d = None, tolerance
+        for i in unmatched:
+            if objects[i] != gt["name"]:
+                continue
+            d = float(np.hypot(centers[i][0] - gt["center"][0], centers[i][1] - gt["center"][1]))
+            if d <= best_d:
+                best, best_d = i, d
+        if best is not None:
+            unmatched.remove(best)
+            matched += 1
+    return matched, len(truth) - matched, len(unmatched)
+
+
+def run_session(path, args):
+    """Calibrate on and run the full perception pipeline over one recorded session."""
+    picker = CubePicker(yolo_onnx_path=args.yolo, coco_names_path=args.names, hardware=False)
+    picker.frame_rotation = None  # recordings are stored already rotated
+    picker.cap = FrameReplay(path, realtime=args.realtime)
+
+    timer = StageTimer()
+    picker._yolo_infer = timer.wrap("yolo", picker._yolo_infer)
+
+    start = t.perf_counter()
+    picker.initialize(init_frames=args.init_frames)
+    timer.add("initialize", t.perf_counter() - start)
+    start = t.perf_counter()
+    picker.calibrate(calib_frames=args.calib_frames)
+    timer.add("calibrate", t.perf_counter() - start)
+
+    labels = read_labels(path)
+    new_labels = {}
+    matched = missed = extra = 0
+    frames = 0
+
+    run_start = t.perf_counter()
+    while True:
+        start = t.perf_counter()
+        ok, frame = picker.read_frame()
+        if not ok:
+            break
+        timer.add("read", t.perf_counter() - start)
+        idx = picker.cap.position - 1
+
+        start = t.perf_counter()
+        frame = picker.crop_frame(frame)
+        timer.add("crop", t.perf_counter() - start)
+
+        start = t.perf_counter()
+        detections = picker.detect(frame)
+        timer.add("detect", t.perf_counter() - start)
+        objects = detections["name"].tolist()
+        # Labels are stored in full-frame pixels (see frame_recorder.py)
+        centers = [picker.uncrop_point(x, y) for x, y in detections["center"].tolist()]
+        frames += 1
+
+        if idx in labels:
+            m, mi, ex = match_detections(objects, centers, labels[idx], args.tolerance)
+            matched += m; missed += mi; extra += ex
+        if args.write_labels:
+            new_labels[idx] = [{"name": o, "center": [int(round(c[0])), int(round(c[1]))]}
+                               for o, c in zip(objects, centers)]
+    elapsed = t.perf_counter() - run_start
+    picker.cap.release()
+
+    if args.write_labels:
+        write_labels(path, new_labels)
+
+    result = {
+        "session": path,
+        "frames": frames,
+        "fps": frames / elapsed if elapsed > 0 else 0.0,
+        "stages": timer.summary(),
+    }
+    if labels:
+        total = 2 * matched + missed + extra
+        result["agreement"] = {
+            "matched": matched,
+            "missed": missed,
+            "extra": extra,
+            "f1": (2 * matched / total) if total else 1.0,
+        }
+    return result
+
+
+def print_result(res):
+    print(f"\n=== {res['session']} ===")
+    print(f"frames: {res['frames']}   throughput: {res['fps']:.2f} frames/s")
+    print(f"{'stage':<12}{'count':>7}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for stage, s in res["stages"].items():
+        print(f"{stage:<12}{s['count']:>7}{s['mean_ms']:>10.2f}{s['p50_ms']:>10.2f}"
+              f"{s['p95_ms']:>10.2f}{s['max_ms']:>10.2f}")
+    if "agreement" in res:
+        a = res["agreement"]
+        print(f"agreement: F1 {a['f1']:.3f}  (matched {a['matched']}, missed {a['missed']}, extra {a['extra']})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline perception benchmark over recorded sessions.")
+    parser.add_argument("sessions", nargs="+", help="session files written by frame_recorder.py")
+    parser.add_argument("--yolo", default=None, help="path to yolov5s.onnx")
+    parser.add_argument("--names", default=None, help="path to coco.names")
+    parser.add_argument("--init-frames", type=int, default=12)
+    parser.add_argument("--calib-frames", type=int, default=60)
+    parser.add_argument("--realtime", action="store_true", help="replay at the recorded frame rate")
+    parser.add_argument("--tolerance", type=float, default=10.0,
+                        help="max center distance (full-frame px) for a detection to agree with a label")
+    parser.add_argument("--write-labels", action="store_true",
+                        help="store this run's detections as the session labels (reference run)")
+    parser.add_argument("--json", default=None, help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = [run_session(path, args) for path in args.sessions]
+    for res in results:
+        print_result(res)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+import argparse
+import json
+import time
+
+import main as control
+from sim_drivers import SimSession
+
+
+# (phase, object attribute, method) timed during a session
+PHASES = [
+    ("calibrate", "picker", "initialize"),
+    ("calibrate", "picker", "calibrate"),
+    ("detect", "picker", "detect"),
+    ("verify", "picker", "verify_grasp"),
+    ("verify", "picker", "relocate"),
+    ("grasp", "picker", "grasp"),
+    ("speak", "tts", "speak"),
+    ("listen", "stt", "speech_to_text_vosk"),
+    ("llm", "selector", "select_objects"),
+]
+
+
+def run_benchmark(path):
+    """Run one scripted session through main.run() on the simulated drivers and time each phase."""
+    sim = SimSession.from_yaml(path)
+    sim.clock.install(control)
+    clock = sim.clock
+    phases = {}
+
+    def timed(phase, fn):
+        def wrapper(*args, **kwargs):
+            start = clock.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                spent = phases.setdefault(phase, [0.0, 0])
+                spent[0] += clock.perf_counter() - start
+                spent[1] += 1
+        return wrapper
+
+    # Grasp checks that reported success, right or wrong; the camera knows what was really picked
+    verified = [0]
+
+    def counted(fn):
+        def wrapper(*args, **kwargs):
+            status, detection = fn(*args, **kwargs)
+            verified[0] += status == "success"
+            return status, detection
+        return wrapper
+
+    for method in ("verify_grasp", "relocate"):
+        setattr(sim.picker, method, counted(getattr(sim.picker, method)))
+    for phase, owner, method in PHASES:
+        obj = getattr(sim, owner)
+        setattr(obj, method, timed(phase, getattr(obj, method)))
+
+    wall_start = time.perf_counter()
+    start = clock.perf_counter()
+    try:
+        control.run(sim.picker, sim.stt, sim.tts, sim.selector, headless=True, trigger=sim.trigger)
+    finally:
+        total = clock.perf_counter() - start
+        wall = time.perf_counter() - wall_start
+        sim.close()
+
+    picks = sim.camera.picked
+    # Pick rate over the working part of the session, i.e. after calibration
+    working = total - phases.get("calibrate", [0.0])[0]
+    accounted = sum(v[0] for v in phases.values())
+    breakdown = {p: {"seconds": v[0], "calls": v[1]} for p, v in phases.items()}
+    breakdown["other"] = {"seconds": max(total - accounted, 0.0), "calls": 0}
+
+    return {
+        "config": path,
+        "modeled_seconds": total,
+        "wall_seconds": wall,
+        "picks": picks,
+        "grasp_attempts": sim.grasp_attempts,
+        "verified_successes": verified[0],
+        "picks_per_minute": 60.0 * picks / working if working > 0 else 0.0,
+        "phases": breakdown,
+        "arm": {
+            "moves": sim.arm.moves,
+            "motion_seconds": sim.arm.motion_time,
+            "short_waits": sim.arm_clock.short_waits,
+            "interrupted_moves": sim.arm.interrupted,
+        },
+        "llm_requests": sim.llm.requests,
+    }
+
+
+def print_result(res):
+    print(f"\n=== {res['config']} ===")
+    print(f"picks: {res['picks']} in {res['grasp_attempts']} attempts "
+          f"({res['verified_successes']} verified as successful)   "
+          f"{res['picks_per_minute']:.2f} picks/min   "
+          f"modeled {res['modeled_seconds']:.1f} s (wall {res['wall_seconds']:.1f} s)")
+    print(f"{'phase':<12}{'calls':>7}{'seconds':>10}{'share':>8}")
+    for phase, v in sorted(res["phases"].items(), key=lambda kv: -kv[1]["seconds"]):
+        share = 100.0 * v["seconds"] / res["modeled_seconds"] if res["modeled_seconds"] > 0 else 0.0
+        print(f"{phase:<12}{v['calls']:>7}{v['seconds']:>10.2f}{share:>7.1f}%")
+    arm = res["arm"]
+    print(f"arm: {arm['moves']} moves, {arm['motion_seconds']:.1f} s modeled motion, "
+          f"{arm['short_waits']} fixed waits shorter than the motion, "
+          f"{arm['interrupted_moves']} moves commanded before the previous one finished")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hardware-free pick-cycle benchmark on the simulated drivers.")
+    parser.add_argument("configs", nargs="*", default=["sim.yaml"], help="session configs (see sim.yaml)")
+    parser.add_argument("--json", default=None, help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = [run_benchmark(path) for path in args.configs]
+    for res in results:
+        print_result(res)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
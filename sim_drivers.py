@@ -0,0 +1,489 @@
+import glob
+import json
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import numpy as np
+from omegaconf import OmegaConf
+
+import cube_picker
+from cube_picker import CubePicker
+from frame_recorder import FrameReplay
+from llm_grasp_selector import LLMGraspSelector
+
+
+# ============================
+# Clock
+# ============================
+class SimClock:
+    """
+    Modeled time for the simulated cell. sleep() advances the clock by the
+    full duration but only really sleeps time_scale of it (0 = never block),
+    so robot waits and speech cost nothing in wall time but still show up in
+    time()/perf_counter().
+    """
+
+    def __init__(self, time_scale=0.0):
+        self.time_scale = time_scale
+        self._offset = 0.0
+        self._lock = threading.Lock()
+        self._installed = []
+
+    def sleep(self, seconds):
+        if seconds <= 0:
+            return
+        if self.time_scale > 0:
+            time.sleep(seconds * self.time_scale)
+        with self._lock:
+            self._offset += seconds * (1.0 - min(self.time_scale, 1.0))
+
+    def time(self):
+        return time.time() + self._offset
+
+    def perf_counter(self):
+        return time.perf_counter() + self._offset
+
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+    def install(self, *modules, proxy=None):
+        """Replace the `time as t` alias of the given modules with this clock (or a proxy of it)."""
+        for m in modules:
+            self._installed.append((m, m.t))
+            m.t = proxy or self
+
+    def uninstall(self):
+        while self._installed:
+            m, orig = self._installed.pop()
+            m.t = orig
+
+
+# ============================
+# GPIO / arm
+# ============================
+class SimGPIO:
+    """Stand-in for the RPi.GPIO module; calls on_grip / on_release when the gripper closes / opens."""
+    BCM = "BCM"
+    BOARD = "BOARD"
+    OUT = "OUT"
+    IN = "IN"
+
+    def __init__(self, gripper_pin=20, on_grip=None, on_release=None):
+        self.gripper_pin = gripper_pin
+        self.on_grip = on_grip
+        self.on_release = on_release
+        self.pins = {}
+        self.grips = 0
+
+    def setwarnings(self, flag):
+        pass
+
+    def setmode(self, mode):
+        pass
+
+    def setup(self, pin, mode):
+        self.pins.setdefault(pin, None)
+
+    def output(self, pin, value):
+        prev = self.pins.get(pin)
+        self.pins[pin] = value
+        if pin != self.gripper_pin:
+            return
+        # active-low gripper (see CubePicker.set_gripper)
+        if prev == 1 and value == 0:
+            self.grips += 1
+            if self.on_grip is not None:
+                self.on_grip()
+        elif prev == 0 and value == 1 and self.on_release is not None:
+            self.on_release()
+
+    def cleanup(self):
+        self.pins.clear()
+
+
+class SimMyCobot280:
+    """
+    Stand-in for pymycobot.MyCobot280 with a simple motion-time model:
+    joint moves take settle + max joint delta / joint speed, Cartesian moves
+    settle + straight-line distance / linear speed, both scaled by the
+    commanded speed (0-100). A move commanded while the previous one is still
+    running counts as interrupted. See ArmWaitClock for how the model feeds
+    into modeled cycle time.
+    """
+
+    def __init__(self, clock, joint_speed=120.0, linear_speed=150.0, settle=0.2):
+        self.clock = clock
+        self.joint_speed = joint_speed    # deg/s at speed 100
+        self.linear_speed = linear_speed  # mm/s at speed 100
+        self.settle = settle              # s per move
+        self.angles = [0.0] * 6
+        self.coords = None
+        self.busy_until = 0.0
+        self.moves = 0
+        self.interrupted = 0
+        self.motion_time = 0.0
+
+    def power_on(self):
+        pass
+
+    def send_angles(self, angles, speed):
+        delta = max(abs(a - b) for a, b in zip(angles, self.angles))
+        self.angles = list(angles)
+        self.coords = None  # no forward kinematics; next Cartesian move uses the nominal distance
+        self._start(self.settle + delta / (self.joint_speed * max(speed, 1) / 100.0))
+
+    def send_coords(self, coords, speed, mode=0):
+        if self.coords is None:
+            dist = 150.0  # typical reach from a joint-space pose
+        else:
+            dist = float(np.linalg.norm(np.subtract(coords[:3], self.coords[:3])))
+        self.coords = list(coords)
+        self._start(self.settle + dist / (self.linear_speed * max(speed, 1) / 100.0))
+
+    def get_angles(self):
+        return list(self.angles)
+
+    def get_coords(self):
+        return list(self.coords) if self.coords is not None else None
+
+    def is_moving(self):
+        return 1 if self.clock.time() < self.busy_until else 0
+
+    def remaining(self):
+        """Seconds until the current move finishes."""
+        return max(self.busy_until - self.clock.time(), 0.0)
+
+    def _start(self, duration):
+        now = self.clock.time()
+        if now < self.busy_until:
+            self.interrupted += 1
+        self.busy_until = now + duration
+        self.moves += 1
+        self.motion_time += duration
+
+
+class ArmWaitClock:
+    """
+    Clock seen by cube_picker.py, whose sleeps are all waits for the arm.
+    With wait_for_motion each wait lasts max(sleep, remaining modeled
+    motion), so the arm settings show up in cycle time; otherwise only the
+    fixed sleeps count. Either way, waits shorter than the remaining motion
+    are counted in short_waits.
+    """
+
+    def __init__(self, clock, arm, wait_for_motion=True):
+        self.clock = clock
+        self.arm = arm
+        self.wait_for_motion = wait_for_motion
+        self.short_waits = 0
+
+    def sleep(self, seconds):
+        remaining = self.arm.remaining()
+        if seconds < remaining:
+            self.short_waits += 1
+            if self.wait_for_motion:
+                seconds = remaining
+        self.clock.sleep(seconds)
+
+    def __getattr__(self, name):
+        return getattr(self.clock, name)
+
+
+# ============================
+# Camera
+# ============================
+class SimCamera:
+    """
+    cv2.VideoCapture stand-in that shows one still image per workspace state
+    and moves on to the next state after every successful pick. The images
+    do not say where objects are, so commands must pick objects in the order
+    the states remove them. The last state is kept once the list runs out.
+    """
+
+    def __init__(self, frames):
+        if not frames:
+            raise ValueError("SimCamera needs at least one frame.")
+        self.frames = frames
+        self.state = 0
+        self.picked = 0  # objects actually removed from the workspace
+
+    def pick(self, robot_xy):
+        """The gripper took an object (position unknown to pre-recorded states)."""
+        self.state = min(self.state + 1, len(self.frames) - 1)
+        self.picked += 1
+
+    def isOpened(self):
+        return True
+
+    def open(self, index):
+        return True
+
+    def grab(self):
+        return True
+
+    def read(self):
+        return True, self.frames[self.state].copy()
+
+    def release(self):
+        pass
+
+
+class SyntheticWorkspace(SimCamera):
+    """
+    Rendered workspace (already rotated) with the two calibration markers and
+    one cube per entry of `cubes`. pick() removes the cube nearest the grasp
+    position, mapped through the picker's crop and calibration, so objects can
+    be picked in any order.
+    """
+    BGR = {
+        "blue": (200, 100, 40),
+        "green": (150, 200, 40),
+        "yellow": (30, 200, 220),
+        "red": (40, 50, 220),
+    }
+    CUBE = 80  # px
+
+    def __init__(self, cubes, picker=None, tolerance=25.0, size=(480, 640)):
+        self.picker = picker
+        self.picked = 0
+        self.tolerance = tolerance  # mm between grasp position and cube center
+        h, w = size
+        self.base = np.full((h, w, 3), 230, np.uint8)
+        aruco_dict = cv2.aruco.Dictionary_get(cv2.aruco.DICT_6X6_250)
+        for marker_id, (x, y) in enumerate([(60, h - 120), (w - 120, 60)]):
+            self.base[y:y + 40, x:x + 40] = cv2.aruco.drawMarker(aruco_dict, marker_id, 40)[:, :, None]
+        # (color, x, y) of the top-left corner of every cube still in the workspace
+        self.cubes = [(color, 120 + (i % 4) * 110, 130 + (i // 4) * 120) for i, color in enumerate(cubes)]
+
+    def pick(self, robot_xy):
+        if self.picker is None or self.picker.M is None or not self.cubes:
+            return
+        dist = []
+        for color, x, y in self.cubes:
+            cx, cy = self.picker.crop_point(x + self.CUBE / 2, y + self.CUBE / 2)
+            X, Y = self.picker.pixel_to_robot_xy(cx, cy)
+            dist.append(np.hypot(X - robot_xy[0], Y - robot_xy[1]))
+        i = int(np.argmin(dist))
+        if dist[i] <= self.tolerance:
+            print(f"[SIM] Picked the {self.cubes[i][0]} cube")
+            del self.cubes[i]
+            self.picked += 1
+        else:
+            print(f"[SIM] Gripper closed {dist[i]:.0f} mm from the nearest cube; nothing picked")
+
+    def read(self):
+        img = self.base.copy()
+        for color, x, y in self.cubes:
+            img[y:y + self.CUBE, x:x + self.CUBE] = self.BGR[color]
+        return True, img
+
+
+def load_frames(source):
+    """A directory of images (sorted by name) or a frame_recorder.py session, one frame per state."""
+    if os.path.isdir(source):
+        paths = sorted(p for p in glob.glob(os.path.join(source, "*"))
+                       if p.lower().endswith((".png", ".jpg", ".jpeg", ".bmp")))
+        frames = [cv2.imread(p) for p in paths]
+    else:
+        with FrameReplay(source) as replay:
+            frames = [np.array(replay[i]) for i in range(len(replay))]
+    if not frames:
+        raise ValueError(f"No frames found in {source}.")
+    return frames
+
+
+# ============================
+# Audio
+# ============================
+class SimTTS:
+    """BlockingTTS stand-in: speaking takes overhead + words / words_per_second of modeled time."""
+
+    def __init__(self, clock, words_per_second=2.5, overhead=0.3):
+        self.clock = clock
+        self.words_per_second = words_per_second
+        self.overhead = overhead
+        self.spoken = []
+
+    def speak(self, text):
+        print(f"[TTS SAYS] {text}")
+        self.spoken.append(text)
+        self.clock.sleep(self.overhead + len(text.split()) / self.words_per_second)
+
+
+class SimSTT:
+    """VoskSTT stand-in returning scripted commands; says "quit" once the script is used up."""
+
+    def __init__(self, clock, commands, listen_time=2.0):
+        self.clock = clock
+        self.commands = list(commands)
+        self.listen_time = listen_time
+
+    def speech_to_text_vosk(self):
+        print("[VOSK STT] Speech-to-text listening!")
+        self.clock.sleep(self.listen_time)
+        text = self.commands.pop(0) if self.commands else "quit"
+        print(f"[VOSK STT] Speech-to-text done listening! ({text})")
+        return text
+
+
+class SimTrigger:
+    """Headless detection trigger for main.run(): fires max_cycles detections, then quits."""
+
+    def __init__(self, max_cycles):
+        self.remaining = max_cycles
+
+    def poll(self, timeout):
+        if self.remaining <= 0:
+            return "quit"
+        self.remaining -= 1
+        return "detect"
+
+
+# ============================
+# LLM
+# ============================
+class FakeLLMServer:
+    """
+    Local Ollama-style /api/generate endpoint for LLMGraspSelector. Objects
+    are chosen by name in the order the command mentions them ("red" matches
+    "red cube"); "all"/"everything" selects every object in listed order.
+    """
+
+    def __init__(self, clock, latency=1.5, host="127.0.0.1", port=0):
+        self.clock = clock
+        self.latency = latency
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                reply = json.dumps({"response": json.dumps(server.answer(body["prompt"])), "done": True})
+                server.requests += 1
+                server.clock.sleep(server.latency)
+                data = (reply + "\n").encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self.url = f"http://{host}:{self._server.server_address[1]}/api/generate"
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def answer(self, prompt):
+        listed = re.search(r"Available objects:\s*(\[.*?\])\s*User command:", prompt, re.S)
+        objects = json.loads(listed.group(1)) if listed else []
+        cmd = re.search(r'User command: "(.*)"', prompt)
+        command = cmd.group(1).lower() if cmd else ""
+
+        if re.search(r"\b(all|everything)\b", command):
+            chosen = objects
+        else:
+            mentions = []
+            for obj in objects:
+                name = obj["color"].lower()
+                for key in (name, name.replace(" cube", "")):
+                    pos = command.find(key)
+                    if pos >= 0:
+                        mentions.append((pos, obj["index"], obj))
+                        break
+            chosen = [obj for _, _, obj in sorted(mentions, key=lambda m: (m[0], m[1]))]
+
+        actions = [{"index": o["index"], "color": o["color"], "center": o["center"]} for o in chosen]
+        names = ", ".join(o["color"] for o in chosen)
+        return {
+            "response": f"I will pick the {names}." if chosen else "I could not find that object.",
+            "actions": actions,
+            "reasoning": "simulated LLM: matched object names in the command",
+        }
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+# ============================
+# Session
+# ============================
+DEFAULTS = {
+    "time_scale": 0.0,
+    "yolo_onnx_path": None,
+    "inference_server": None,
+    "camera": {"source": "synthetic", "rotated": True, "cubes": ["blue", "green", "yellow", "red"],
+               "pick_tolerance": 25.0},
+    "arm": {"joint_speed": 120.0, "linear_speed": 150.0, "settle": 0.2, "wait_for_motion": True,
+            "fail_grasps": []},
+    "audio": {"words_per_second": 2.5, "speak_overhead": 0.3, "listen_time": 2.0,
+              "commands": ["pick everything"]},
+    "llm": {"latency": 1.5},
+    "max_cycles": None,
+}
+
+
+class SimSession:
+    """All simulated drivers for one cell, wired together from a config (see sim.yaml)."""
+
+    def __init__(self, cfg=None):
+        self.cfg = cfg = OmegaConf.merge(OmegaConf.create(DEFAULTS), cfg or {})
+        self.clock = SimClock(cfg.time_scale)
+        self.arm = SimMyCobot280(self.clock, cfg.arm.joint_speed, cfg.arm.linear_speed, cfg.arm.settle)
+        self.arm_clock = ArmWaitClock(self.clock, self.arm, cfg.arm.wait_for_motion)
+        self.clock.install(cube_picker, proxy=self.arm_clock)
+
+        # Grasp attempts (1-based) where the gripper closes on nothing
+        self.fail_grasps = set(cfg.arm.fail_grasps)
+        self.grasp_attempts = 0
+        self._grip_xy = None
+        self.gpio = SimGPIO(on_grip=self._on_grip, on_release=self._on_release)
+
+        self.picker = CubePicker(yolo_onnx_path=cfg.yolo_onnx_path, inference_server=cfg.inference_server,
+                                 gpio=self.gpio, arm=self.arm)
+        if cfg.camera.source == "synthetic":
+            self.camera = SyntheticWorkspace(list(cfg.camera.cubes), self.picker, cfg.camera.pick_tolerance)
+        else:
+            self.camera = SimCamera(load_frames(cfg.camera.source))
+        self.picker.cap = self.camera
+        if cfg.camera.rotated:
+            self.picker.frame_rotation = None
+
+        self.tts = SimTTS(self.clock, cfg.audio.words_per_second, cfg.audio.speak_overhead)
+        self.stt = SimSTT(self.clock, cfg.audio.commands, cfg.audio.listen_time)
+        self.llm = FakeLLMServer(self.clock, cfg.llm.latency)
+        self.selector = LLMGraspSelector(url=self.llm.url)
+
+        max_cycles = cfg.max_cycles if cfg.max_cycles is not None else len(cfg.audio.commands) + 1
+        self.trigger = SimTrigger(max_cycles)
+
+    def _on_grip(self):
+        self.grasp_attempts += 1
+        if self.grasp_attempts in self.fail_grasps:
+            print(f"[SIM] Grasp {self.grasp_attempts} scripted to miss")
+            self._grip_xy = None
+            return
+        # The gripper closes right after the descend, so the arm is at the grasp position.
+        # CubePicker.grasp() sends robot (X, Y) as coords [Y, X].
+        coords = self.arm.get_coords()
+        self._grip_xy = (coords[1], coords[0]) if coords else None
+
+    def _on_release(self):
+        if self._grip_xy is not None:
+            self.camera.pick(self._grip_xy)
+        self._grip_xy = None
+
+    @classmethod
+    def from_yaml(cls, path):
+        return cls(OmegaConf.load(path))
+
+    def close(self):
+        self.llm.close()
+        self.clock.uninstall()
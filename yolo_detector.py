@@ -0,0 +1,98 @@
+import cv2
+import numpy as np
+
+
+class YoloDetector:
+    """YOLOv5 ONNX model run through OpenCV DNN, for single frames or batches."""
+
+    def __init__(self, onnx_path):
+        self.onnx_path = onnx_path
+
+        self.INPUT_WIDTH = 640
+        self.INPUT_HEIGHT = 640
+        self.CONFIDENCE_THRESHOLD = 0.45
+        self.SCORE_THRESHOLD = 0.50
+        self.NMS_THRESHOLD = 0.45
+
+        self.net = cv2.dnn.readNet(onnx_path)
+        self.batched = True  # cleared if the exported model only accepts batch size 1
+
+    # ---------------------------------------------------------
+    # Public API
+    # ---------------------------------------------------------
+    def infer(self, img):
+        """
+        Returns list of (left, top, width, height, confidence, class_id)
+        in original image coordinates, after NMS.
+        """
+        blob = self._blob(img)
+        self.net.setInput(blob)
+        outs = self.net.forward(self.net.getUnconnectedOutLayersNames())
+        # YOLOv5 ONNX: outs[0] shape [1, N, 85]
+        return self._postprocess(outs[0][0], img.shape[:2])
+
+    def infer_batch(self, imgs):
+        """Runs several frames (any sizes) through one forward pass; returns one detection list per frame."""
+        if len(imgs) == 1 or not self.batched:
+            return [self.infer(img) for img in imgs]
+
+        blob = cv2.dnn.blobFromImages(
+            imgs, scalefactor=1/255.0, size=(self.INPUT_WIDTH, self.INPUT_HEIGHT),
+            mean=(0,0,0), swapRB=True, crop=False
+        )
+        self.net.setInput(blob)
+        try:
+            outs = self.net.forward(self.net.getUnconnectedOutLayersNames())
+        except cv2.error:
+            outs = None
+        if outs is None or outs[0].shape[0] != len(imgs):
+            # Model exported with a fixed batch dimension (it either raises or returns a single result)
+            print("[YOLO] Model does not accept batched input; falling back to one frame per pass")
+            self.batched = False
+            return [self.infer(img) for img in imgs]
+        return [self._postprocess(outs[0][i], img.shape[:2]) for i, img in enumerate(imgs)]
+
+    # ---------------------------------------------------------
+    # Internal helpers
+    # ---------------------------------------------------------
+    def _blob(self, img):
+        # Letterbox-free simple resize; YOLOv5 ONNX exported head expects 640x640
+        blob = cv2.dnn.blobFromImage(
+            img, scalefactor=1/255.0, size=(self.INPUT_WIDTH, self.INPUT_HEIGHT),
+            mean=(0,0,0), swapRB=True, crop=False
+        )
+        return blob
+
+    def _postprocess(self, detections, image_hw):
+        h, w = image_hw
+        boxes, scores, class_ids = [], [], []
+
+        x_factor = w / self.INPUT_WIDTH
+        y_factor = h / self.INPUT_HEIGHT
+
+        for det in detections:
+            obj_conf = float(det[4])
+            if obj_conf < self.CONFIDENCE_THRESHOLD:
+                continue
+            class_scores = det[5:]
+            cid = int(np.argmax(class_scores))
+            cls_score = float(class_scores[cid])
+            if cls_score < self.SCORE_THRESHOLD:
+                continue
+
+            cx, cy, bw, bh = det[0], det[1], det[2], det[3]
+            left   = int((cx - bw/2) * x_factor)
+            top    = int((cy - bh/2) * y_factor)
+            width  = int(bw * x_factor)
+            height = int(bh * y_factor)
+
+            boxes.append([left, top, width, height])
+            scores.append(obj_conf * cls_score)
+            class_ids.append(cid)
+
+        if not boxes:
+            return []
+
+        idxs = cv2.dnn.NMSBoxes(boxes, scores, self.CONFIDENCE_THRESHOLD, self.NMS_THRESHOLD)
+        idxs = idxs.flatten().tolist() if len(idxs) else []
+        return [(boxes[i][0], boxes[i][1], boxes[i][2], boxes[i][3], scores[i], class_ids[i]) for i in idxs]